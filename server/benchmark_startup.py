@@ -0,0 +1,87 @@
+"""Measure how long the API takes to start answering /api/ready.
+
+Starts uvicorn in a fresh temporary directory, first against an empty database
+(cold: schema is created) and then against the existing one (warm: schema
+check is skipped), and reports import and time-to-ready for each run.
+
+Import time is also measured with passlib, jose and csv imported up front,
+as the server did before they were deferred, so both are timed on the same
+machine. Runs are interleaved to spread out noise; expect absolute numbers
+to vary between environments.
+
+Usage: python benchmark_startup.py [runs]
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# What the server imported at module load before deferring its heavy dependencies
+EAGER_IMPORTS = "import passlib.context, jose.jwt, csv; "
+
+
+def measure_import(workdir, eager=False):
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", (EAGER_IMPORTS if eager else "") + "import server"],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": SERVER_DIR},
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return time.perf_counter() - started
+
+
+def measure_ready(workdir, timeout=30.0):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": SERVER_DIR},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/ready", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Server did not become ready in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as workdir:
+        import_times, eager_import_times = [], []
+        for _ in range(runs):
+            eager_import_times.append(measure_import(workdir, eager=True))
+            import_times.append(measure_import(workdir))
+        cold = measure_ready(workdir)
+        warm = [measure_ready(workdir) for _ in range(runs)]
+
+    print(f"import server, eager imports (median of {runs}): {sorted(eager_import_times)[runs // 2] * 1000:.0f} ms")
+    print(f"import server, deferred imports (median of {runs}): {sorted(import_times)[runs // 2] * 1000:.0f} ms")
+    print(f"time to ready, empty database:   {cold * 1000:.0f} ms")
+    print(f"time to ready, current schema (median of {runs}): {sorted(warm)[runs // 2] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
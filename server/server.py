@@ -1,23 +1,24 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Header, status
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Header, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import sqlite3
 import os
 from contextlib import contextmanager
 from fastapi.responses import JSONResponse
 import json
-import csv
-from io import StringIO
-import secrets
-import hashlib
-import datetime
-from jose import jwt, JWTError
 from datetime import datetime, timedelta
 import random
 import string
-from passlib.context import CryptContext
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from functools import lru_cache
 
 app = FastAPI(title="Golf Course API")
 
@@ -51,6 +52,127 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # Token valid for 1 week
 
+# Playing handicaps accepted for net scoring; plus handicaps are negative
+MIN_HANDICAP = -10
+MAX_HANDICAP = 54
+
+# Bump whenever initialize_database changes so existing databases are migrated on the next start
+SCHEMA_VERSION = 1
+
+# Cached process state for the health and readiness probes
+server_state = {"ready": False, "started_at": None, "schema_migrated": None, "startup_seconds": None}
+
+# Admission control for the endpoints that run bcrypt
+AUTH_PATHS = {"/api/token", "/api/register"}
+IP_RATE_BURST = int(os.environ.get("AUTH_IP_RATE_BURST", 10))
+IP_RATE_PER_MINUTE = float(os.environ.get("AUTH_IP_RATE_PER_MINUTE", 20))
+ACCOUNT_RATE_BURST = int(os.environ.get("AUTH_ACCOUNT_RATE_BURST", 5))
+ACCOUNT_RATE_PER_MINUTE = float(os.environ.get("AUTH_ACCOUNT_RATE_PER_MINUTE", 5))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("AUTH_RATE_LIMIT_MAX_KEYS", 10000))
+MAX_CONCURRENT_HASHES = int(os.environ.get("AUTH_MAX_CONCURRENT_HASHES", 2))
+MAX_QUEUED_HASHES = int(os.environ.get("AUTH_MAX_QUEUED_HASHES", 8))
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by client, evicting the least recently seen key when full"""
+
+    def __init__(self, burst: int, per_minute: float, max_keys: int):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key; return 0 when allowed, otherwise seconds until one is available"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0.0
+
+        self.rejected += 1
+        return (1 - bucket[0]) / self.rate if self.rate > 0 else 60.0
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "tracked_keys": len(self.buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+        }
+
+
+ip_limiter = TokenBucketLimiter(IP_RATE_BURST, IP_RATE_PER_MINUTE, RATE_LIMIT_MAX_KEYS)
+account_limiter = TokenBucketLimiter(ACCOUNT_RATE_BURST, ACCOUNT_RATE_PER_MINUTE, RATE_LIMIT_MAX_KEYS)
+hash_semaphore = asyncio.Semaphore(MAX_CONCURRENT_HASHES)
+hash_stats = {"in_flight": 0, "completed": 0, "rejected": 0}
+
+
+def too_many_requests(retry_after: float, detail: str = "Too many requests, please try again later"):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def get_client_ip(request: Request) -> str:
+    # nginx forwards the original address in X-Real-IP
+    return request.headers.get("x-real-ip") or (request.client.host if request.client else "unknown")
+
+
+def check_account_rate_limit(email: str):
+    retry_after = account_limiter.acquire(email)
+    if retry_after:
+        raise too_many_requests(retry_after)
+
+
+async def run_password_hashing(func, *args):
+    """Run a bcrypt operation off the event loop, capped at MAX_CONCURRENT_HASHES at a time"""
+    if hash_stats["in_flight"] >= MAX_CONCURRENT_HASHES + MAX_QUEUED_HASHES:
+        hash_stats["rejected"] += 1
+        raise too_many_requests(1, "Server is busy, please try again shortly")
+
+    hash_stats["in_flight"] += 1
+    try:
+        async with hash_semaphore:
+            result = await run_in_threadpool(func, *args)
+        hash_stats["completed"] += 1
+        return result
+    finally:
+        hash_stats["in_flight"] -= 1
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Reject bursts against the password endpoints before they reach bcrypt"""
+    if request.method == "POST" and request.url.path in AUTH_PATHS:
+        retry_after = ip_limiter.acquire(get_client_ip(request))
+        if retry_after:
+            error = too_many_requests(retry_after)
+            return JSONResponse(
+                status_code=error.status_code,
+                content={"detail": error.detail},
+                headers=error.headers,
+            )
+    return await call_next(request)
+
+
 @contextmanager
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
@@ -85,6 +207,7 @@ class RoundBase(BaseModel):
     gir: Optional[List[bool]] = None
     fairways: Optional[List[bool]] = None
     bunkers: Optional[List[int]] = None
+    handicap: Optional[int] = Field(None, ge=MIN_HANDICAP, le=MAX_HANDICAP)
 
 class RoundCreate(RoundBase):
     pass
@@ -93,6 +216,21 @@ class Round(RoundBase):
     id: int
     user_id: int
 
+class ScoreDistribution(BaseModel):
+    eagle_or_better: int
+    birdie: int
+    par: int
+    bogey: int
+    double_bogey_or_worse: int
+
+class HoleStats(BaseModel):
+    rounds_played: int
+    average_score: float
+    average_to_par: float
+    distribution: ScoreDistribution
+    gir_rate: Optional[float] = None
+    average_putts: Optional[float] = None
+
 class Hole(BaseModel):
     id: Optional[int] = None
     tee_box_id: int
@@ -100,6 +238,8 @@ class Hole(BaseModel):
     distance: int
     par: int
     hcp_index: int
+    stats: Optional[HoleStats] = None
+    suggested_hcp_index: Optional[int] = None
 
 class TeeBox(BaseModel):
     id: Optional[int] = None
@@ -123,6 +263,7 @@ class HoleCreate(BaseModel):
     hcp_index: int
 
 class TeeBoxCreate(BaseModel):
+    id: Optional[int] = None
     name: str
     #color: str
     holes: List[HoleCreate]
@@ -135,10 +276,15 @@ class CourseCreate(BaseModel):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
-def initialize_database():
+def initialize_database() -> bool:
+    """Create or migrate the schema, returning False when user_version shows it is already current"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
 
+        schema_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if schema_version >= SCHEMA_VERSION:
+            return False
+
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS courses (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -191,6 +337,7 @@ def initialize_database():
             gir TEXT,
             fairways TEXT,
             bunkers TEXT,
+            handicap INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id),
             FOREIGN KEY (course_id) REFERENCES courses (id),
@@ -198,17 +345,73 @@ def initialize_database():
          )
          ''')
 
+        round_columns = [column['name'] for column in cursor.execute('PRAGMA table_info(rounds)').fetchall()]
+        if 'handicap' not in round_columns:
+            cursor.execute('ALTER TABLE rounds ADD COLUMN handicap INTEGER')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hole_stats (
+            tee_box_id INTEGER NOT NULL,
+            hole_number INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            rounds_played INTEGER NOT NULL DEFAULT 0,
+            total_strokes INTEGER NOT NULL DEFAULT 0,
+            total_to_par INTEGER NOT NULL DEFAULT 0,
+            eagle_or_better INTEGER NOT NULL DEFAULT 0,
+            birdie INTEGER NOT NULL DEFAULT 0,
+            par INTEGER NOT NULL DEFAULT 0,
+            bogey INTEGER NOT NULL DEFAULT 0,
+            double_bogey_or_worse INTEGER NOT NULL DEFAULT 0,
+            gir_hits INTEGER NOT NULL DEFAULT 0,
+            gir_recorded INTEGER NOT NULL DEFAULT 0,
+            total_putts INTEGER NOT NULL DEFAULT 0,
+            putts_recorded INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tee_box_id, hole_number),
+            FOREIGN KEY (course_id) REFERENCES courses (id),
+            FOREIGN KEY (tee_box_id) REFERENCES tee_boxes (id)
+        )
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_hole_stats_course ON hole_stats (course_id)')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            params TEXT,
+            progress INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        if schema_version < 1:
+            # hole_stats is new in version 1, so backfill it from the rounds already stored
+            recompute_hole_stats(cursor)
+
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
+        return True
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib/bcrypt and jose are imported on first use to keep them off the startup path
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Password hashing
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def generate_user_key():
@@ -221,6 +424,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -230,6 +434,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    from jose import jwt, JWTError
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -257,12 +462,400 @@ def validate_email(email: str) -> bool:
     return re.match(pattern, email) is not None
 
 
+HOLE_STATS_COLUMNS = (
+    'rounds_played', 'total_strokes', 'total_to_par', 'eagle_or_better', 'birdie', 'par',
+    'bogey', 'double_bogey_or_worse', 'gir_hits', 'gir_recorded', 'total_putts', 'putts_recorded'
+)
+
+# Minimum rounds on every hole of a tee box before a recalibrated stroke index is suggested
+HOLE_STATS_MIN_ROUNDS = int(os.environ.get("HOLE_STATS_MIN_ROUNDS", 20))
+
+
+def record_round_hole_stats(cursor, tee_box_id: int, scores: List[int],
+                            putts: Optional[List[int]], gir: Optional[List[bool]]):
+    """Fold a newly saved round into the per-hole running totals"""
+    tee_box = cursor.execute('SELECT course_id FROM tee_boxes WHERE id = ?', (tee_box_id,)).fetchone()
+    if tee_box is None:
+        return
+    course_id = tee_box['course_id']
+
+    pars = {
+        hole['number']: hole['par']
+        for hole in cursor.execute(
+            'SELECT number, par FROM holes WHERE tee_box_id = ?', (tee_box_id,)
+        ).fetchall()
+    }
+
+    rows = []
+    for index, score in enumerate(scores):
+        hole_number = index + 1
+        if score <= 0 or hole_number not in pars:
+            continue
+
+        to_par = score - pars[hole_number]
+        hole_putts = putts[index] if putts and index < len(putts) and putts[index] > 0 else None
+        hole_gir = gir[index] if gir and index < len(gir) else None
+        rows.append((
+            tee_box_id, hole_number, course_id,
+            1, score, to_par,
+            int(to_par <= -2), int(to_par == -1), int(to_par == 0), int(to_par == 1), int(to_par >= 2),
+            int(bool(hole_gir)), int(hole_gir is not None),
+            hole_putts or 0, int(hole_putts is not None),
+        ))
+
+    if not rows:
+        return
+
+    increments = ', '.join(f'{column} = {column} + excluded.{column}' for column in HOLE_STATS_COLUMNS)
+    cursor.executemany(
+        f'''INSERT INTO hole_stats (tee_box_id, hole_number, course_id, {', '.join(HOLE_STATS_COLUMNS)})
+            VALUES ({', '.join('?' * (3 + len(HOLE_STATS_COLUMNS)))})
+            ON CONFLICT (tee_box_id, hole_number) DO UPDATE SET {increments}''',
+        rows
+    )
+
+
+def recompute_hole_stats(cursor, course_id: Optional[int] = None, tee_box_ids: Optional[List[int]] = None):
+    """Rebuild hole_stats from the rounds table, for one course, some tee boxes or everything.
+
+    The aggregation runs as a single set-based query over json_each() so
+    backfills don't have to decode every round in Python.
+    """
+    if tee_box_ids is not None:
+        placeholders = ', '.join('?' * len(tee_box_ids))
+        scope = f'WHERE r.tee_box_id IN ({placeholders})'
+        params = tuple(tee_box_ids)
+        cursor.execute(f'DELETE FROM hole_stats WHERE tee_box_id IN ({placeholders})', params)
+    elif course_id is not None:
+        scope = 'WHERE t.course_id = ?'
+        params = (course_id,)
+        cursor.execute('DELETE FROM hole_stats WHERE course_id = ?', params)
+    else:
+        scope = ''
+        params = ()
+        cursor.execute('DELETE FROM hole_stats')
+
+    cursor.execute(
+        f'''INSERT INTO hole_stats (tee_box_id, hole_number, course_id, {', '.join(HOLE_STATS_COLUMNS)})
+            SELECT tee_box_id, hole_number, course_id,
+                   COUNT(*),
+                   SUM(score),
+                   SUM(score - par),
+                   SUM(score - par <= -2),
+                   SUM(score - par = -1),
+                   SUM(score - par = 0),
+                   SUM(score - par = 1),
+                   SUM(score - par >= 2),
+                   COALESCE(SUM(gir), 0),
+                   COUNT(gir),
+                   COALESCE(SUM(putts), 0),
+                   COUNT(putts)
+            FROM (
+                SELECT r.tee_box_id, t.course_id, s.key + 1 AS hole_number,
+                       s.value AS score, h.par,
+                       json_extract(r.gir, '$[' || s.key || ']') AS gir,
+                       CASE WHEN json_extract(r.putts, '$[' || s.key || ']') > 0
+                            THEN json_extract(r.putts, '$[' || s.key || ']') END AS putts
+                FROM rounds r
+                         JOIN tee_boxes t ON t.id = r.tee_box_id
+                         JOIN json_each(r.scores) s
+                         JOIN holes h ON h.tee_box_id = r.tee_box_id AND h.number = s.key + 1
+                {scope}
+            )
+            WHERE score > 0
+            GROUP BY tee_box_id, hole_number''',
+        params
+    )
+
+
+def format_hole_stats(row) -> Dict[str, Any]:
+    rounds_played = row['rounds_played']
+    return {
+        "rounds_played": rounds_played,
+        "average_score": round(row['total_strokes'] / rounds_played, 2),
+        "average_to_par": round(row['total_to_par'] / rounds_played, 2),
+        "distribution": {
+            "eagle_or_better": row['eagle_or_better'],
+            "birdie": row['birdie'],
+            "par": row['par'],
+            "bogey": row['bogey'],
+            "double_bogey_or_worse": row['double_bogey_or_worse'],
+        },
+        "gir_rate": round(row['gir_hits'] / row['gir_recorded'], 3) if row['gir_recorded'] else None,
+        "average_putts": round(row['total_putts'] / row['putts_recorded'], 2) if row['putts_recorded'] else None,
+    }
+
+
+def suggest_hcp_indexes(holes: List[Dict[str, Any]]) -> Dict[int, int]:
+    """Rank holes hardest-first by average score versus par.
+
+    Returns an empty mapping until every hole has HOLE_STATS_MIN_ROUNDS rounds.
+    """
+    if not holes or any(
+        not hole.get('stats') or hole['stats']['rounds_played'] < HOLE_STATS_MIN_ROUNDS
+        for hole in holes
+    ):
+        return {}
+
+    ranked = sorted(holes, key=lambda hole: (-hole['stats']['average_to_par'], hole['hcp_index']))
+    return {hole['number']: rank for rank, hole in enumerate(ranked, start=1)}
+
+
+class TeeBoxLayout:
+    """Par, stroke index and distance of a tee box's holes, packed in arrays indexed by hole number - 1"""
+
+    __slots__ = ('tee_box_id', 'par', 'hcp_index', 'distance', 'stroke_rank', '_strokes_cache')
+
+    def __init__(self, tee_box_id: int, holes):
+        holes = sorted(holes, key=lambda hole: hole['number'])
+        size = holes[-1]['number'] if holes else 0
+        self.tee_box_id = tee_box_id
+        self.par = array('i', [0] * size)
+        self.hcp_index = array('i', [0] * size)
+        self.distance = array('i', [0] * size)
+        for hole in holes:
+            index = hole['number'] - 1
+            self.par[index] = hole['par']
+            self.hcp_index[index] = hole['hcp_index']
+            self.distance[index] = hole['distance']
+
+        # Rank the holes 1..n by stroke index so nine-hole layouts with odd/even indexes allocate correctly
+        self.stroke_rank = array('i', [0] * size)
+        ranked = sorted((index for index in range(size) if self.par[index]), key=lambda index: self.hcp_index[index])
+        for rank, index in enumerate(ranked, start=1):
+            self.stroke_rank[index] = rank
+        self._strokes_cache: Dict[int, array] = {}
+
+    @property
+    def hole_count(self) -> int:
+        return sum(1 for par in self.par if par)
+
+    def strokes_received(self, handicap: int) -> array:
+        """Strokes received on each hole, giving strokes back on the easiest holes for plus handicaps"""
+        strokes = self._strokes_cache.get(handicap)
+        if strokes is not None:
+            return strokes
+
+        holes = self.hole_count
+        strokes = array('i', [0] * len(self.par))
+        if holes:
+            base, extra = divmod(abs(handicap), holes)
+            for index, rank in enumerate(self.stroke_rank):
+                if not rank:
+                    continue
+                if handicap >= 0:
+                    strokes[index] = base + (1 if rank <= extra else 0)
+                else:
+                    strokes[index] = -(base + (1 if rank > holes - extra else 0))
+
+        self._strokes_cache[handicap] = strokes
+        return strokes
+
+
+def load_tee_box_layouts(conn, tee_box_ids) -> Dict[int, TeeBoxLayout]:
+    """Load the hole layouts of several tee boxes with a single query"""
+    tee_box_ids = list(set(tee_box_ids))
+    if not tee_box_ids:
+        return {}
+
+    holes_by_tee: Dict[int, List[sqlite3.Row]] = {tee_box_id: [] for tee_box_id in tee_box_ids}
+    placeholders = ', '.join('?' * len(tee_box_ids))
+    for hole in conn.execute(
+        f'SELECT tee_box_id, number, distance, par, hcp_index FROM holes WHERE tee_box_id IN ({placeholders})',
+        tee_box_ids
+    ).fetchall():
+        holes_by_tee[hole['tee_box_id']].append(hole)
+
+    return {tee_box_id: TeeBoxLayout(tee_box_id, holes) for tee_box_id, holes in holes_by_tee.items()}
+
+
+def score_rounds(rounds, layouts: Dict[int, TeeBoxLayout]) -> List[Dict[str, Any]]:
+    """Compute gross, net and Stableford totals for many rounds at once.
+
+    Each round is a (tee_box_id, scores, handicap) tuple. Holes with no score
+    are skipped, and net and Stableford values are None without a handicap.
+    Scores on holes the tee box no longer has are left out of every total
+    and counted in unmatched_holes instead.
+    """
+    results = []
+    for tee_box_id, scores, handicap in rounds:
+        layout = layouts.get(tee_box_id)
+        pars = layout.par if layout else array('i')
+        strokes = layout.strokes_received(handicap) if layout and handicap is not None else None
+
+        gross = par_played = received = stableford = unmatched = 0
+        for index, score in enumerate(scores):
+            if score <= 0:
+                continue
+            if index >= len(pars) or not pars[index]:
+                unmatched += 1
+                continue
+            gross += score
+            par_played += pars[index]
+            if strokes is not None:
+                received += strokes[index]
+                stableford += max(0, 2 + pars[index] + strokes[index] - score)
+
+        net = gross - received if strokes is not None else None
+        results.append({
+            "total_score": gross,
+            "par": par_played,
+            "score_to_par": gross - par_played,
+            "handicap": handicap,
+            "net_score": net,
+            "net_to_par": net - par_played if net is not None else None,
+            "stableford_points": stableford if strokes is not None else None,
+            "unmatched_holes": unmatched,
+        })
+    return results
+
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+job_executor: Optional[ThreadPoolExecutor] = None
+exclusive_job_executor: Optional[ThreadPoolExecutor] = None
+JOB_HANDLERS: Dict[str, Any] = {}
+
+# Jobs that rewrite course data run one at a time, in submission order, on a single worker
+EXCLUSIVE_JOB_TYPES = set()
+
+
+def job_handler(job_type: str, exclusive: bool = False):
+    """Register a function(conn, params, job) that runs jobs of the given type"""
+    def register(func):
+        JOB_HANDLERS[job_type] = func
+        if exclusive:
+            EXCLUSIVE_JOB_TYPES.add(job_type)
+        return func
+    return register
+
+
+class JobContext:
+    """Progress and partial result of a running job"""
+
+    def __init__(self, job_id: int, progress: int, total: Optional[int], result: Dict[str, Any]):
+        self.job_id = job_id
+        self.progress = progress
+        self.total = total
+        self.result = result
+
+    def checkpoint(self, cursor, progress: Optional[int] = None, total: Optional[int] = None):
+        """Record progress in the caller's transaction, so it commits together with the work it describes"""
+        if progress is not None:
+            self.progress = progress
+        if total is not None:
+            self.total = total
+        cursor.execute(
+            'UPDATE jobs SET progress = ?, total = ?, result = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (self.progress, self.total, json.dumps(self.result), self.job_id)
+        )
+
+
+def submit_job(job_type: str, params: Dict[str, Any]) -> int:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO jobs (type, params) VALUES (?, ?)',
+            (job_type, json.dumps(params))
+        )
+        conn.commit()
+        job_id = cursor.lastrowid
+
+    enqueue_job(job_id, job_type)
+    return job_id
+
+
+def enqueue_job(job_id: int, job_type: str):
+    executor = exclusive_job_executor if job_type in EXCLUSIVE_JOB_TYPES else job_executor
+    executor.submit(run_job, job_id)
+
+
+def run_job(job_id: int):
+    with get_db_connection() as conn:
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not job or job['status'] not in ('queued', 'running'):
+            return
+
+        execute_job(conn, job)
+
+
+def execute_job(conn, job):
+    job_id = job['id']
+    conn.execute(
+        '''UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+               updated_at = CURRENT_TIMESTAMP WHERE id = ?''',
+        (job_id,)
+    )
+    conn.commit()
+
+    job_context = JobContext(job_id, job['progress'], job['total'],
+                             json.loads(job['result']) if job['result'] else {})
+    try:
+        handler = JOB_HANDLERS.get(job['type'])
+        if handler is None:
+            raise ValueError(f"Unknown job type '{job['type']}'")
+        handler(conn, json.loads(job['params']) if job['params'] else {}, job_context)
+    except Exception as e:
+        conn.rollback()
+        conn.execute(
+            '''UPDATE jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP,
+                   updated_at = CURRENT_TIMESTAMP WHERE id = ?''',
+            (getattr(e, 'detail', None) or str(e), job_id)
+        )
+        conn.commit()
+        return
+
+    # params can hold a whole uploaded file and is only needed to resume, so drop it once done
+    conn.execute(
+        '''UPDATE jobs SET status = 'succeeded', progress = ?, total = ?, result = ?, params = NULL,
+               finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP WHERE id = ?''',
+        (job_context.progress, job_context.total, json.dumps(job_context.result), job_id)
+    )
+    conn.commit()
+
+
+def start_job_runner():
+    """Start the worker pools and requeue jobs that were queued or running when the server last stopped"""
+    global job_executor, exclusive_job_executor
+    job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    exclusive_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-exclusive")
+
+    with get_db_connection() as conn:
+        pending = conn.execute(
+            "SELECT id, type FROM jobs WHERE status IN ('queued', 'running') ORDER BY id"
+        ).fetchall()
+
+    for job in pending:
+        enqueue_job(job['id'], job['type'])
+
+
+def format_job(row) -> Dict[str, Any]:
+    return {
+        "id": row['id'],
+        "type": row['type'],
+        "status": row['status'],
+        "progress": row['progress'],
+        "total": row['total'],
+        "error": row['error'],
+        "created_at": row['created_at'],
+        "started_at": row['started_at'],
+        "finished_at": row['finished_at'],
+    }
+
+
 @app.on_event("startup")
 async def startup_event():
-    if not os.path.exists(DB_PATH):
-        initialize_database()
-    else:
-        initialize_database()
+    started = time.perf_counter()
+    server_state["schema_migrated"] = initialize_database()
+    start_job_runner()
+    server_state["startup_seconds"] = round(time.perf_counter() - started, 4)
+    server_state["started_at"] = time.time()
+    server_state["ready"] = True
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    server_state["ready"] = False
+    job_executor.shutdown(wait=False, cancel_futures=True)
+    exclusive_job_executor.shutdown(wait=False, cancel_futures=True)
 
 @app.post("/api/register", response_model=Token, status_code=201)
 async def register_user(user_create: UserCreate):
@@ -275,33 +868,41 @@ async def register_user(user_create: UserCreate):
             detail="Invalid email format"
         )
 
+    email_taken = HTTPException(
+        status_code=400,
+        detail="Email already registered"
+    )
+
     with get_db_connection() as conn:
         existing_user = conn.execute(
             'SELECT * FROM users WHERE email = ?',
             (email,)
         ).fetchone()
 
-        if existing_user:
-            raise HTTPException(
-                status_code=400,
-                detail="Email already registered"
-            )
+    if existing_user:
+        raise email_taken
 
-        password_hash = get_password_hash(user_create.password)
+    # No connection is held while waiting for a hashing slot; the UNIQUE
+    # constraint catches a concurrent registration for the same email
+    check_account_rate_limit(email)
+    password_hash = await run_password_hashing(get_password_hash, user_create.password)
 
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO users (email, password_hash) VALUES (?, ?)',
-            (email, password_hash)
-        )
-        conn.commit()
+    with get_db_connection() as conn:
+        try:
+            conn.execute(
+                'INSERT INTO users (email, password_hash) VALUES (?, ?)',
+                (email, password_hash)
+            )
+            conn.commit()
+        except sqlite3.IntegrityError:
+            raise email_taken
 
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": email}, expires_delta=access_token_expires
-        )
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": email}, expires_delta=access_token_expires
+    )
 
-        return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer"}
 
 
 @app.post("/api/token", response_model=Token)
@@ -315,13 +916,15 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             detail="Invalid email format"
         )
 
+    check_account_rate_limit(email)
+
     with get_db_connection() as conn:
         user = conn.execute(
             'SELECT * FROM users WHERE email = ?',
             (email,)
         ).fetchone()
 
-        if not user or not verify_password(form_data.password, user["password_hash"]):
+        if not user or not await run_password_hashing(verify_password, form_data.password, user["password_hash"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -351,6 +954,15 @@ async def create_round(round_data: RoundCreate, current_user: dict = Depends(get
     with get_db_connection() as conn:
         cursor = conn.cursor()
 
+        tee_box = conn.execute(
+            'SELECT course_id FROM tee_boxes WHERE id = ?', (round_data.tee_box_id,)
+        ).fetchone()
+        if not tee_box or tee_box['course_id'] != round_data.course_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Tee box does not belong to the selected course"
+            )
+
         scores_json = json.dumps(round_data.scores)
         putts_json = json.dumps(round_data.putts) if round_data.putts else None
         gir_json = json.dumps(round_data.gir) if round_data.gir else None
@@ -359,24 +971,29 @@ async def create_round(round_data: RoundCreate, current_user: dict = Depends(get
 
         cursor.execute(
             '''INSERT INTO rounds
-               (user_id, course_id, tee_box_id, date, scores, putts, gir, fairways, bunkers)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+               (user_id, course_id, tee_box_id, date, scores, putts, gir, fairways, bunkers, handicap)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
             (current_user["id"], round_data.course_id, round_data.tee_box_id,
-             round_data.date, scores_json, putts_json, gir_json, fairways_json, bunkers_json)
+             round_data.date, scores_json, putts_json, gir_json, fairways_json, bunkers_json,
+             round_data.handicap)
         )
+        round_id = cursor.lastrowid
+
+        record_round_hole_stats(cursor, round_data.tee_box_id,
+                                round_data.scores, round_data.putts, round_data.gir)
 
         conn.commit()
-        round_id = cursor.lastrowid
 
         return {"id": round_id, "message": "Round saved successfully"}
 
 @app.get("/api/rounds")
-async def get_user_rounds(current_user: dict = Depends(get_current_user)):
-    """Get all rounds for the current user"""
+async def get_user_rounds(handicap: Optional[int] = Query(None, ge=MIN_HANDICAP, le=MAX_HANDICAP),
+                          current_user: dict = Depends(get_current_user)):
+    """Get all rounds for the current user, scored with the handicap saved on each round or the given one"""
     with get_db_connection() as conn:
         rounds_data = conn.execute(
             '''SELECT r.id, r.course_id, r.tee_box_id, r.date, r.scores,
-                      r.putts, r.gir, r.fairways, r.bunkers,
+                      r.putts, r.gir, r.fairways, r.bunkers, r.handicap,
                       c.name as course_name, t.name as tee_name
                FROM rounds r
                         JOIN courses c ON r.course_id = c.id
@@ -386,9 +1003,17 @@ async def get_user_rounds(current_user: dict = Depends(get_current_user)):
             (current_user["id"],)
         ).fetchall()
 
+        all_scores = [json.loads(round_data["scores"]) for round_data in rounds_data]
+        layouts = load_tee_box_layouts(conn, [round_data["tee_box_id"] for round_data in rounds_data])
+        scored = score_rounds(
+            [(round_data["tee_box_id"], scores,
+              round_data["handicap"] if round_data["handicap"] is not None else handicap)
+             for round_data, scores in zip(rounds_data, all_scores)],
+            layouts
+        )
+
         result = []
-        for round_data in rounds_data:
-            scores = json.loads(round_data["scores"])
+        for round_data, scores, totals in zip(rounds_data, all_scores, scored):
 
             putts = json.loads(round_data["putts"]) if round_data["putts"] else None
             gir = json.loads(round_data["gir"]) if round_data["gir"] else None
@@ -408,11 +1033,67 @@ async def get_user_rounds(current_user: dict = Depends(get_current_user)):
                 "gir": gir,
                 "fairways": fairways,
                 "bunkers": bunkers,
-                "total_score": sum(score for score in scores if score > 0)
+                **totals
             })
 
         return result
 
+@app.get("/api/courses/{course_id}/leaderboard")
+async def get_course_leaderboard(course_id: int, tee_box_id: Optional[int] = None,
+                                 order_by: str = "net", limit: int = Query(10, ge=1, le=100)):
+    """Best rounds on a course by net score or Stableford points, for rounds saved with a handicap"""
+    if order_by not in ("net", "stableford"):
+        raise HTTPException(status_code=400, detail="order_by must be 'net' or 'stableford'")
+
+    with get_db_connection() as conn:
+        query = '''SELECT r.id, r.tee_box_id, r.date, r.scores, r.handicap,
+                          t.name as tee_name
+                   FROM rounds r
+                            JOIN tee_boxes t ON r.tee_box_id = t.id
+                   WHERE r.course_id = ? AND r.handicap IS NOT NULL'''
+        params: List[Any] = [course_id]
+        if tee_box_id is not None:
+            query += ' AND r.tee_box_id = ?'
+            params.append(tee_box_id)
+        rounds_data = conn.execute(query, params).fetchall()
+
+        layouts = load_tee_box_layouts(conn, [round_data["tee_box_id"] for round_data in rounds_data])
+        scored = score_rounds(
+            [(round_data["tee_box_id"], json.loads(round_data["scores"]), round_data["handicap"])
+             for round_data in rounds_data],
+            layouts
+        )
+
+    entries = [
+        {
+            "round_id": round_data["id"],
+            "tee_box_id": round_data["tee_box_id"],
+            "tee_name": round_data["tee_name"],
+            "date": round_data["date"],
+            **totals
+        }
+        for round_data, totals in zip(rounds_data, scored)
+    ]
+    if order_by == "net":
+        entries.sort(key=lambda entry: (entry["net_to_par"], entry["date"]))
+    else:
+        entries.sort(key=lambda entry: (-entry["stableford_points"], entry["date"]))
+
+    return entries[:limit]
+
+@app.get("/api/admission-metrics")
+async def get_admission_metrics():
+    """Counters for the auth rate limiters and the password hashing pool"""
+    return {
+        "ip_limiter": ip_limiter.metrics(),
+        "account_limiter": account_limiter.metrics(),
+        "password_hashing": {
+            **hash_stats,
+            "max_concurrent": MAX_CONCURRENT_HASHES,
+            "max_queued": MAX_QUEUED_HASHES,
+        },
+    }
+
 @app.get("/api/courses", response_model=List[Course])
 async def get_all_courses(include_inactive: bool = False):
     with get_db_connection() as conn:
@@ -422,12 +1103,30 @@ async def get_all_courses(include_inactive: bool = False):
             courses = conn.execute('SELECT * FROM courses WHERE active = 1').fetchall()
         return [dict(course) for course in courses]
 
+@app.get("/api/health", status_code=200)
+async def health_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/api/ready", status_code=200)
+async def readiness_check():
+    """Readiness probe answered from cached startup state, without touching the database"""
+    if not server_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+
+    return {
+        "status": "ready",
+        "uptime_seconds": round(time.time() - server_state["started_at"], 1),
+        "schema_version": SCHEMA_VERSION,
+        "schema_migrated": server_state["schema_migrated"],
+        "startup_seconds": server_state["startup_seconds"],
+    }
+
 @app.get("/api/check-database", status_code=200)
 async def check_database():
     """Check if the database has any courses without seeding"""
     with get_db_connection() as conn:
-        count = conn.execute('SELECT COUNT(*) as count FROM courses').fetchone()
-        has_courses = count['count'] > 0
+        has_courses = bool(conn.execute('SELECT EXISTS (SELECT 1 FROM courses)').fetchone()[0])
 
         return {
             "initialized": True,
@@ -477,6 +1176,11 @@ async def get_course_by_id(course_id: int):
         tee_boxes = conn.execute('SELECT * FROM tee_boxes WHERE course_id = ?', (course_id,)).fetchall()
         tee_boxes_list = [dict(tee_box) for tee_box in tee_boxes]
 
+        hole_stats = {
+            (row['tee_box_id'], row['hole_number']): format_hole_stats(row)
+            for row in conn.execute('SELECT * FROM hole_stats WHERE course_id = ?', (course_id,)).fetchall()
+        }
+
         # Get holes for each tee box
         for tee_box in tee_boxes_list:
             holes = conn.execute(
@@ -485,6 +1189,12 @@ async def get_course_by_id(course_id: int):
             ).fetchall()
             tee_box['holes'] = [dict(hole) for hole in holes]
 
+            for hole in tee_box['holes']:
+                hole['stats'] = hole_stats.get((tee_box['id'], hole['number']))
+            suggested = suggest_hcp_indexes(tee_box['holes'])
+            for hole in tee_box['holes']:
+                hole['suggested_hcp_index'] = suggested.get(hole['number'])
+
         # Combine course with tee boxes
         course_dict = dict(course)
         course_dict['teeBoxes'] = tee_boxes_list
@@ -502,32 +1212,133 @@ async def update_course(course_id: int, course: CourseCreate):
         if not existing:
             raise HTTPException(status_code=404, detail="Course not found")
 
-        cursor.execute(
-            'UPDATE courses SET name = ?, location = ?, description = ? WHERE id = ?',
-            (course.name, course.location, course.description, course_id)
-        )
+        if (existing['name'], existing['location'], existing['description']) != \
+                (course.name, course.location, course.description):
+            cursor.execute(
+                'UPDATE courses SET name = ?, location = ?, description = ? WHERE id = ?',
+                (course.name, course.location, course.description, course_id)
+            )
 
-        tee_boxes = conn.execute('SELECT id FROM tee_boxes WHERE course_id = ?', (course_id,)).fetchall()
-        for tee_box in tee_boxes:
-            cursor.execute('DELETE FROM holes WHERE tee_box_id = ?', (tee_box['id'],))
-        cursor.execute('DELETE FROM tee_boxes WHERE course_id = ?', (course_id,))
+        stale_tee_box_ids = sync_course_tee_boxes(cursor, course_id, course.teeBoxes)
+        if stale_tee_box_ids:
+            recompute_hole_stats(cursor, tee_box_ids=stale_tee_box_ids)
 
-        for tee_box in course.teeBoxes:
+        conn.commit()
+
+        return await get_course_by_id(course_id)
+
+
+def sync_course_tee_boxes(cursor, course_id: int, tee_boxes: List[TeeBoxCreate]) -> List[int]:
+    """Apply the submitted tee boxes as a diff against the stored ones.
+
+    Tee boxes are matched by id when given, otherwise by name, and holes by
+    number, so unchanged rows keep their ids and rounds stay linked to them.
+    Returns the ids of tee boxes whose hole stats need recomputing.
+    """
+    stored_tees = cursor.execute(
+        'SELECT id, name FROM tee_boxes WHERE course_id = ?', (course_id,)
+    ).fetchall()
+    stored_by_id = {tee['id']: tee for tee in stored_tees}
+
+    # Claim explicit ids first so an id-less tee box can't take a stored row another entry refers to
+    matches: List[Optional[sqlite3.Row]] = [None] * len(tee_boxes)
+    kept_ids = set()
+    for index, tee_box in enumerate(tee_boxes):
+        stored = stored_by_id.get(tee_box.id) if tee_box.id is not None else None
+        if stored is not None and stored['id'] not in kept_ids:
+            matches[index] = stored
+            kept_ids.add(stored['id'])
+
+    unclaimed_by_name: Dict[str, List[sqlite3.Row]] = {}
+    for tee in stored_tees:
+        if tee['id'] not in kept_ids:
+            unclaimed_by_name.setdefault(tee['name'], []).append(tee)
+
+    for index, tee_box in enumerate(tee_boxes):
+        if matches[index] is None and unclaimed_by_name.get(tee_box.name):
+            matches[index] = unclaimed_by_name[tee_box.name].pop(0)
+            kept_ids.add(matches[index]['id'])
+
+    stale_tee_box_ids = []
+    for tee_box, stored in zip(tee_boxes, matches):
+        if stored is None:
             cursor.execute(
                 'INSERT INTO tee_boxes (course_id, name) VALUES (?, ?)',
                 (course_id, tee_box.name)
             )
             tee_box_id = cursor.lastrowid
-
-            for hole in tee_box.holes:
+        else:
+            tee_box_id = stored['id']
+            if stored['name'] != tee_box.name:
                 cursor.execute(
-                    'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
-                    (tee_box_id, hole.number, hole.distance, hole.par, hole.hcp_index)
+                    'UPDATE tee_boxes SET name = ? WHERE id = ?',
+                    (tee_box.name, tee_box_id)
                 )
+        kept_ids.add(tee_box_id)
 
-        conn.commit()
+        if sync_tee_box_holes(cursor, tee_box_id, tee_box.holes) and stored is not None:
+            stale_tee_box_ids.append(tee_box_id)
 
-        return await get_course_by_id(course_id)
+    removed_ids = [tee_id for tee_id in stored_by_id if tee_id not in kept_ids]
+    for tee_box_id in removed_ids:
+        in_use = cursor.execute(
+            'SELECT 1 FROM rounds WHERE tee_box_id = ? LIMIT 1', (tee_box_id,)
+        ).fetchone()
+        if in_use:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Tee box '{stored_by_id[tee_box_id]['name']}' has recorded rounds and cannot be removed"
+            )
+        cursor.execute('DELETE FROM holes WHERE tee_box_id = ?', (tee_box_id,))
+        cursor.execute('DELETE FROM tee_boxes WHERE id = ?', (tee_box_id,))
+
+    return stale_tee_box_ids
+
+
+def sync_tee_box_holes(cursor, tee_box_id: int, holes: List[HoleCreate]) -> bool:
+    """Insert, update or delete only the holes of a tee box that changed.
+
+    Returns True when a par changed or holes were added or removed, which
+    invalidates the tee box's hole stats.
+    """
+    stored_holes = {
+        hole['number']: hole
+        for hole in cursor.execute(
+            'SELECT id, number, distance, par, hcp_index FROM holes WHERE tee_box_id = ?',
+            (tee_box_id,)
+        ).fetchall()
+    }
+
+    inserts = []
+    updates = []
+    par_changed = False
+    submitted_numbers = set()
+    for hole in holes:
+        submitted_numbers.add(hole.number)
+        stored = stored_holes.get(hole.number)
+        if stored is None:
+            inserts.append((tee_box_id, hole.number, hole.distance, hole.par, hole.hcp_index))
+        elif (stored['distance'], stored['par'], stored['hcp_index']) != \
+                (hole.distance, hole.par, hole.hcp_index):
+            updates.append((hole.distance, hole.par, hole.hcp_index, stored['id']))
+            par_changed = par_changed or stored['par'] != hole.par
+
+    deletes = [(hole['id'],) for number, hole in stored_holes.items() if number not in submitted_numbers]
+
+    if deletes:
+        cursor.executemany('DELETE FROM holes WHERE id = ?', deletes)
+    if updates:
+        cursor.executemany(
+            'UPDATE holes SET distance = ?, par = ?, hcp_index = ? WHERE id = ?',
+            updates
+        )
+    if inserts:
+        cursor.executemany(
+            'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
+            inserts
+        )
+
+    return par_changed or bool(inserts) or bool(deletes)
 
 @app.patch("/api/courses/{course_id}/toggle-active", status_code=200)
 async def toggle_course_active(course_id: int):
@@ -550,143 +1361,221 @@ async def toggle_course_active(course_id: int):
 
         return {"id": course_id, "active": bool(new_status)}
 
-@app.post("/api/seed", status_code=201)
+@app.post("/api/hole-stats/rebuild", status_code=202)
+async def rebuild_hole_stats(course_id: Optional[int] = None):
+    """Queue a recompute of per-hole statistics from every stored round"""
+    job_id = submit_job("rebuild_hole_stats", {"course_id": course_id})
+    return {"job_id": job_id, "status": "queued"}
+
+@job_handler("rebuild_hole_stats", exclusive=True)
+def run_rebuild_hole_stats_job(conn, params: Dict[str, Any], job: "JobContext"):
+    cursor = conn.cursor()
+    course_id = params.get("course_id")
+    recompute_hole_stats(cursor, course_id)
+    if course_id is not None:
+        count = conn.execute('SELECT COUNT(*) as count FROM hole_stats WHERE course_id = ?', (course_id,)).fetchone()
+    else:
+        count = conn.execute('SELECT COUNT(*) as count FROM hole_stats').fetchone()
+    job.result["holes"] = count['count']
+    job.result["message"] = "Hole statistics rebuilt"
+    job.checkpoint(cursor, progress=1, total=1)
+    conn.commit()
+
+@app.post("/api/seed", status_code=202)
 async def seed_database():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    """Queue a reset of the course data to the built-in sample courses"""
+    job_id = submit_job("seed", {})
+    return {"job_id": job_id, "status": "queued"}
+
+@job_handler("seed", exclusive=True)
+def run_seed_job(conn, params: Dict[str, Any], job: "JobContext"):
+    cursor = conn.cursor()
+
+    cursor.execute('DELETE FROM hole_stats')
+    cursor.execute('DELETE FROM holes')
+    cursor.execute('DELETE FROM tee_boxes')
+    cursor.execute('DELETE FROM courses')
+
+    courses = [
+        ('Bro Hof Slott GC', 'Stockholm, Sweden', 'Championship level course'),
+        ('Ullna Golf Club', 'Stockholm, Sweden', 'Beautiful lakeside course'),
+        ('Halmstad GK (North)', 'Halmstad, Sweden', 'Classic Swedish course'),
+        ('Falsterbo GK', 'Falsterbo, Sweden', 'Stunning coastal links'),
+        ('Barsebäck Golf & CC', 'Barsebäck, Sweden', 'Former European Tour venue')
+    ]
+
+    cursor.executemany(
+        'INSERT INTO courses (name, location, description) VALUES (?, ?, ?)',
+        courses
+    )
+
+    inserted_courses = cursor.execute('SELECT id FROM courses ORDER BY id').fetchall()
 
-        cursor.execute('DELETE FROM holes')
-        cursor.execute('DELETE FROM tee_boxes')
-        cursor.execute('DELETE FROM courses')
+    for course_row in inserted_courses:
+        course_id = course_row['id']
 
-        courses = [
-            ('Bro Hof Slott GC', 'Stockholm, Sweden', 'Championship level course'),
-            ('Ullna Golf Club', 'Stockholm, Sweden', 'Beautiful lakeside course'),
-            ('Halmstad GK (North)', 'Halmstad, Sweden', 'Classic Swedish course'),
-            ('Falsterbo GK', 'Falsterbo, Sweden', 'Stunning coastal links'),
-            ('Barsebäck Golf & CC', 'Barsebäck, Sweden', 'Former European Tour venue')
+        tee_boxes = [
+            (course_id, 'Championship'),
+            (course_id, 'Club'),
+            (course_id, 'Forward')
         ]
 
         cursor.executemany(
-            'INSERT INTO courses (name, location, description) VALUES (?, ?, ?)',
-            courses
+            'INSERT INTO tee_boxes (course_id, name) VALUES (?, ?)',
+            tee_boxes
         )
 
-        inserted_courses = cursor.execute('SELECT id FROM courses ORDER BY id').fetchall()
+        tee_box_rows = cursor.execute(
+            'SELECT id FROM tee_boxes WHERE course_id = ?',
+            (course_id,)
+        ).fetchall()
+
+        for tee_idx, tee_box_row in enumerate(tee_box_rows):
+            tee_box_id = tee_box_row['id']
 
-        for course_row in inserted_courses:
-            course_id = course_row['id']
+            base_distance = 165 - (tee_idx * 15)
+            distance_increment = 15 - (tee_idx * 2)
 
-            tee_boxes = [
-                (course_id, 'Championship'),
-                (course_id, 'Club'),
-                (course_id, 'Forward')
-            ]
+            holes = []
+            for hole_number in range(1, 19):
+                distance = base_distance + ((hole_number - 1) * distance_increment)
+                par = 5 if hole_number % 4 == 0 else (3 if hole_number % 4 == 2 else 4)
+                hcp_index = ((hole_number * 7) % 18) + 1
+
+                holes.append((tee_box_id, hole_number, distance, par, hcp_index))
 
             cursor.executemany(
-                'INSERT INTO tee_boxes (course_id, name) VALUES (?, ?)',
-                tee_boxes
+                'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
+                holes
             )
 
-            tee_box_rows = cursor.execute(
-                'SELECT id FROM tee_boxes WHERE course_id = ?',
-                (course_id,)
-            ).fetchall()
+    job.result["message"] = "Database seeded successfully"
+    job.checkpoint(cursor, progress=1, total=1)
+    conn.commit()
 
-            for tee_idx, tee_box_row in enumerate(tee_box_rows):
-                tee_box_id = tee_box_row['id']
+def insert_course_tree(cursor, course: Dict[str, Any]) -> int:
+    """Insert a course with its tee boxes and holes and return the new course id"""
+    cursor.execute(
+        'INSERT INTO courses (name, location, description) VALUES (?, ?, ?)',
+        (course.get('name'), course.get('location'), course.get('description'))
+    )
+    course_id = cursor.lastrowid
 
-                base_distance = 165 - (tee_idx * 15)
-                distance_increment = 15 - (tee_idx * 2)
+    for tee_box in course['teeBoxes']:
+        cursor.execute(
+            'INSERT INTO tee_boxes (course_id, name) VALUES (?, ?)',
+            (course_id, tee_box['name'])
+        )
+        tee_box_id = cursor.lastrowid
 
-                holes = []
-                for hole_number in range(1, 19):
-                    distance = base_distance + ((hole_number - 1) * distance_increment)
-                    par = 5 if hole_number % 4 == 0 else (3 if hole_number % 4 == 2 else 4)
-                    hcp_index = ((hole_number * 7) % 18) + 1
+        cursor.executemany(
+            'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
+            [(tee_box_id, hole['number'], hole['distance'], hole['par'], hole['hcp_index'])
+             for hole in tee_box['holes']]
+        )
 
-                    holes.append((tee_box_id, hole_number, distance, par, hcp_index))
+    return course_id
 
-                cursor.executemany(
-                    'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
-                    holes
-                )
+@job_handler("course_import", exclusive=True)
+def run_course_import_job(conn, params: Dict[str, Any], job: "JobContext"):
+    """Insert uploaded courses one transaction each, so a restarted job resumes after the last one committed"""
+    courses = params["courses"]
+    cursor = conn.cursor()
+    course_ids = job.result.setdefault("course_ids", [])
 
+    for index in range(job.progress, len(courses)):
+        course_ids.append(insert_course_tree(cursor, courses[index]))
+        job.checkpoint(cursor, progress=index + 1, total=len(courses))
         conn.commit()
 
-        return {"message": "Database seeded successfully"}
+    job.result["message"] = f"Successfully added {len(course_ids)} courses"
 
-@app.post("/api/courses/json-upload", status_code=201)
+@app.post("/api/courses/json-upload", status_code=202)
 async def upload_json_courses(file: UploadFile = File(...)):
-    """Upload and process a JSON file containing course data"""
+    """Validate a JSON file containing course data and queue it for import"""
     try:
         contents = await file.read()
         data = json.loads(contents.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid JSON format")
 
-        courses_to_add = data if isinstance(data, list) else [data]
-
-        added_course_ids = []
+    courses_to_add = data if isinstance(data, list) else [data]
 
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
+    processed_courses = []
+    for course_data in courses_to_add:
+        if not isinstance(course_data, dict) or not all(key in course_data for key in ['name', 'teeBoxes']) \
+                or not isinstance(course_data['teeBoxes'], list):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid course data format. Each course must have 'name' and 'teeBoxes'"
+            )
 
-            for course_data in courses_to_add:
-                if not all(key in course_data for key in ['name', 'teeBoxes']):
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Invalid course data format. Each course must have 'name' and 'teeBoxes'"
-                    )
+        if not isinstance(course_data['name'], str) or not course_data['name'].strip() or not all(
+            course_data.get(key) is None or isinstance(course_data.get(key), str)
+            for key in ['location', 'description']
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid course data format. 'name' must be a non-empty string and "
+                       "'location' and 'description' must be strings"
+            )
 
-                cursor.execute(
-                    'INSERT INTO courses (name, location, description) VALUES (?, ?, ?)',
-                    (course_data.get('name'), course_data.get('location'), course_data.get('description'))
+        tee_boxes = []
+        for tee_box in course_data['teeBoxes']:
+            if not isinstance(tee_box, dict) or not isinstance(tee_box.get('holes', []), list) \
+                    or not all(isinstance(hole, dict) for hole in tee_box.get('holes', [])):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid tee box format. Each tee box must be an object with a list of hole objects"
                 )
-                course_id = cursor.lastrowid
-                added_course_ids.append(course_id)
 
-                for tee_box in course_data.get('teeBoxes', []):
-                    if not all(key in tee_box for key in ['name', 'holes']):
-                        continue
+            if not all(key in tee_box for key in ['name', 'holes']):
+                continue
 
-                    cursor.execute(
-                        'INSERT INTO tee_boxes (course_id, name) VALUES (?, ?)',
-                        (course_id, tee_box.get('name'))
-                    )
-                    tee_box_id = cursor.lastrowid
+            holes = [
+                {key: hole.get(key) for key in ['number', 'distance', 'par', 'hcp_index']}
+                for hole in tee_box['holes']
+                if all(key in hole for key in ['number', 'distance', 'par', 'hcp_index'])
+            ]
 
-                    for hole in tee_box.get('holes', []):
-                        if not all(key in hole for key in ['number', 'distance', 'par', 'hcp_index']):
-                            continue
+            # Reject bad values here so the import job can't fail after committing some courses
+            if not isinstance(tee_box['name'], str) or not tee_box['name'].strip() or not all(
+                isinstance(value, int) and not isinstance(value, bool) and value >= 1
+                for hole in holes for value in hole.values()
+            ):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid tee box in course '{course_data['name']}'. Tee boxes need a name "
+                           "and hole number, distance, par and hcp_index must be positive integers"
+                )
 
-                        cursor.execute(
-                            'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
-                            (tee_box_id, hole.get('number'), hole.get('distance'),
-                             hole.get('par'), hole.get('hcp_index'))
-                        )
+            tee_boxes.append({'name': tee_box['name'], 'holes': holes})
 
-            conn.commit()
+        processed_courses.append({
+            'name': course_data.get('name'),
+            'location': course_data.get('location'),
+            'description': course_data.get('description'),
+            'teeBoxes': tee_boxes
+        })
 
-        return {"message": f"Successfully added {len(added_course_ids)} courses", "course_ids": added_course_ids}
-
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    job_id = submit_job("course_import", {"courses": processed_courses})
+    return {"job_id": job_id, "status": "queued", "total": len(processed_courses)}
 
-@app.post("/api/courses/csv-upload", status_code=201)
+@app.post("/api/courses/csv-upload", status_code=202)
 async def upload_csv_courses(file: UploadFile = File(...)):
     """
-    Upload and process a CSV file containing course data
+    Validate a CSV file containing course data and queue it for import
     Expected CSV format:
     course_name,location,description,tee_name,tee_color,hole_number,distance,par,hcp_index
     """
+    import csv
+    from io import StringIO
+
     try:
         contents = await file.read()
         csv_data = StringIO(contents.decode('utf-8'))
         csv_reader = csv.DictReader(csv_data)
 
-        current_course = None
-        current_tee = None
         courses_data = {}
 
         for row in csv_reader:
@@ -732,53 +1621,55 @@ async def upload_csv_courses(file: UploadFile = File(...)):
             except (ValueError, TypeError):
                 continue
 
-        processed_courses = []
-        for course_name, course_data in courses_data.items():
-            processed_course = {
-                'name': course_data['name'],
-                'location': course_data['location'],
-                'description': course_data['description'],
-                'teeBoxes': list(course_data['teeBoxes'].values())
-            }
-            processed_courses.append(processed_course)
-
-        added_course_ids = []
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-
-            for course in processed_courses:
-                if not course['teeBoxes'] or not any(tee.get('holes') for tee in course['teeBoxes']):
-                    continue
-
-                cursor.execute(
-                    'INSERT INTO courses (name, location, description) VALUES (?, ?, ?)',
-                    (course['name'], course['location'], course['description'])
-                )
-                course_id = cursor.lastrowid
-                added_course_ids.append(course_id)
-
-                for tee_box in course['teeBoxes']:
-                    if not tee_box.get('holes'):
-                        continue
-
-                    cursor.execute(
-                        'INSERT INTO tee_boxes (course_id, name) VALUES (?, ?)',
-                        (course_id, tee_box['name'], tee_box['color'])
-                    )
-                    tee_box_id = cursor.lastrowid
-
-                    for hole in tee_box['holes']:
-                        cursor.execute(
-                            'INSERT INTO holes (tee_box_id, number, distance, par, hcp_index) VALUES (?, ?, ?, ?, ?)',
-                            (tee_box_id, hole['number'], hole['distance'], hole['par'], hole['hcp_index'])
-                        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing CSV file: {str(e)}")
+
+    processed_courses = []
+    for course_name, course_data in courses_data.items():
+        tee_boxes = [tee for tee in course_data['teeBoxes'].values() if tee['holes']]
+        if not tee_boxes:
+            continue
+
+        processed_courses.append({
+            'name': course_data['name'],
+            'location': course_data['location'],
+            'description': course_data['description'],
+            'teeBoxes': tee_boxes
+        })
+
+    job_id = submit_job("course_import", {"courses": processed_courses})
+    return {"job_id": job_id, "status": "queued", "total": len(processed_courses)}
+
+@app.get("/api/jobs")
+async def list_jobs(limit: int = Query(20, ge=1, le=100)):
+    """List the most recent background jobs"""
+    with get_db_connection() as conn:
+        jobs = conn.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [format_job(job) for job in jobs]
 
-            conn.commit()
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: int):
+    """Get the status and progress of a background job"""
+    with get_db_connection() as conn:
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
 
-        return {"message": f"Successfully added {len(added_course_ids)} courses", "course_ids": added_course_ids}
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return format_job(job)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing CSV file: {str(e)}")
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: int):
+    """Get the result of a finished background job"""
+    with get_db_connection() as conn:
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] == 'failed':
+        raise HTTPException(status_code=500, detail=job['error'] or "Job failed")
+    if job['status'] != 'succeeded':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return json.loads(job['result']) if job['result'] else {}
 
 
 if __name__ == "__main__":
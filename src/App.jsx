@@ -287,7 +287,9 @@ function MainApp() {
                 putts: puttCounts,
                 gir: girCounts,
                 fairways: fairwayHits,
-                bunkers: bunkerCounts
+                bunkers: bunkerCounts,
+                // 0 means no handicap was entered; keep the value in the range the server accepts
+                handicap: handicap ? Math.min(54, Math.max(-10, Math.round(handicap))) : null
             });
 
             resetSession();
@@ -116,7 +116,10 @@ export const saveRound = async (roundData) => {
 
         if (!response.ok) {
             const errorData = await response.json();
-            throw new Error(errorData.detail || 'Failed to save round');
+            const detail = Array.isArray(errorData.detail)
+                ? errorData.detail.map(error => error.msg).join(', ')
+                : errorData.detail;
+            throw new Error(detail || 'Failed to save round');
         }
 
         return await response.json();
@@ -71,6 +71,27 @@ export const fetchCourseById = async (courseId) => {
     }
 };
 
+export const waitForJob = async (jobId, pollInterval = 1000) => {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error('Failed to fetch job status');
+        }
+
+        const job = await response.json();
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            const resultResponse = await fetch(`/api/jobs/${jobId}/result`);
+            const result = await resultResponse.json();
+            if (!resultResponse.ok) {
+                throw new Error(result.detail || 'Job failed');
+            }
+            return result;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, pollInterval));
+    }
+};
+
 export const seedDatabase = async () => {
     try {
         const response = await fetch('/api/seed', {
@@ -84,7 +105,8 @@ export const seedDatabase = async () => {
             throw new Error('Network response was not ok');
         }
 
-        return await response.json();
+        const { job_id } = await response.json();
+        return await waitForJob(job_id);
     } catch (error) {
         console.error('Error seeding database:', error);
         throw error;
@@ -128,7 +150,8 @@ export const uploadJsonCourses = async (file) => {
             throw new Error(errorData.detail || 'Failed to upload JSON file');
         }
 
-        return await response.json();
+        const { job_id } = await response.json();
+        return await waitForJob(job_id);
     } catch (error) {
         console.error('Error uploading JSON:', error);
         throw error;
@@ -150,7 +173,8 @@ export const uploadCsvCourses = async (file) => {
             throw new Error(errorData.detail || 'Failed to upload CSV file');
         }
 
-        return await response.json();
+        const { job_id } = await response.json();
+        return await waitForJob(job_id);
     } catch (error) {
         console.error('Error uploading CSV:', error);
         throw error;
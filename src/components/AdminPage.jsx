@@ -50,6 +50,7 @@ function AdminPage() {
 
             if (fullCourseData.teeBoxes && fullCourseData.teeBoxes.length > 0) {
                 const formattedTeeBoxes = fullCourseData.teeBoxes.map(tee => ({
+                    id: tee.id,
                     name: tee.name,
                     holes: tee.holes.map(hole => ({
                         ...hole,